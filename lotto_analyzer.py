@@ -1,7 +1,14 @@
+import hashlib
+import io
 import streamlit as st
 import pandas as pd
+import numpy as np
 from collections import Counter
-from itertools import combinations
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the NumPy splits engine is used instead
+    njit = None
 
 # --- Page Configuration ---
 st.set_page_config(page_title="Lotto Split Strategy Engine", layout="wide")
@@ -20,6 +27,8 @@ game_type = st.sidebar.radio("Select Game Type:", ("UK 49s (6 + Bonus)", "SA Dai
 
 # --- Helper Functions ---
 
+MAX_NUMBER = 49  # Highest ball in either game
+
 def clean_data(df, game_type):
     """Standardizes column names."""
     cols = df.columns.tolist()
@@ -28,110 +37,273 @@ def clean_data(df, game_type):
         if len(numeric_cols) >= 5:
             rename_map = {numeric_cols[i]: f'N{i+1}' for i in range(5)}
             df = df.rename(columns=rename_map)
-            return df[['N1', 'N2', 'N3', 'N4', 'N5']]
+            return df[['N1', 'N2', 'N3', 'N4', 'N5']].dropna(how='all')
     elif game_type == "UK 49s (6 + Bonus)":
         numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
         if len(numeric_cols) >= 7:
             rename_map = {numeric_cols[i]: f'N{i+1}' for i in range(6)}
             rename_map[numeric_cols[6]] = 'Bonus'
             df = df.rename(columns=rename_map)
-            return df[['N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'Bonus']]
+            return df[['N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'Bonus']].dropna(how='all')
     return df
 
-def get_row_numbers(row, game_type):
-    """Returns a set of numbers for a given row."""
-    if game_type == "SA Daily Lotto (5 Numbers)":
-        return {row[f'N{k}'] for k in range(1, 6)}
+@st.cache_data(max_entries=8)
+def load_history(file_bytes, file_name, game_type):
+    """
+    Reads, cleans and validates an uploaded history file; cached on its content across reruns.
+    Returns (main_nums, bonus_nums, onehot): compact int8 arrays (bonus_nums is None for
+    SA Daily Lotto) plus their `build_draw_index`, so reruns don't rebuild the index.
+    Missing cells are kept in place as 0, which is never a ball.
+    """
+    if file_name.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
     else:
-        nums = {row[f'N{k}'] for k in range(1, 7)}
-        if 'Bonus' in row:
-            nums.add(row['Bonus'])
-        return nums
-
-def get_next_numbers_list(df, index, game_type):
-    """Returns the next draw numbers as a list."""
-    if index + 1 >= len(df): return []
-    row = df.iloc[index + 1]
+        df = pd.read_excel(io.BytesIO(file_bytes), engine='calamine')
+    df_clean = clean_data(df, game_type)
+    
+    # clean_data returns the draw columns in order (Bonus last), or the frame unchanged
+    # when it can't find enough numeric columns
+    n_cols = 5 if game_type == "SA Daily Lotto (5 Numbers)" else 7
+    if df_clean.select_dtypes(include=['number']).shape[1] != n_cols:
+        raise ValueError(f"Expected at least {n_cols} numeric columns per draw.")
+    
+    values = df_clean.to_numpy(dtype=np.float64)
+    present = ~np.isnan(values)
+    if present.any() and (values[present].min() < 1 or values[present].max() > MAX_NUMBER):
+        raise ValueError(f"Draw numbers must be between 1 and {MAX_NUMBER}.")
+    if (values[present] != np.round(values[present])).any():
+        raise ValueError("Draw numbers must be whole numbers.")
+    nums = np.where(present, values, 0).astype(np.int8)
+    
     if game_type == "SA Daily Lotto (5 Numbers)":
-        return sorted([row[f'N{k}'] for k in range(1, 6)])
+        main_nums, bonus_nums = nums, None
     else:
-        # For splits, we look at the main 6 numbers usually
-        return sorted([row[f'N{k}'] for k in range(1, 7)])
+        main_nums, bonus_nums = np.ascontiguousarray(nums[:, :6]), np.ascontiguousarray(nums[:, 6])
+    return main_nums, bonus_nums, build_draw_index(main_nums, bonus_nums)
 
-# --- Core Analysis Engines ---
+def build_draw_index(main_nums, bonus_nums):
+    """One-hot encodes every draw: onehot[i, n] = 1 if n was drawn (bonus included) in draw i."""
+    onehot = np.zeros((len(main_nums), MAX_NUMBER + 1), np.float32)
+    rows = np.arange(len(main_nums))
+    onehot[rows[:, None], main_nums] = 1
+    if bonus_nums is not None:
+        onehot[rows, bonus_nums] = 1
+    
+    # Missing numbers (0) never count towards an overlap
+    onehot[:, 0] = 0
+    return onehot
 
-def analyze_patterns(df, current_numbers, game_type):
-    """Standard Frequency Analysis."""
-    predictions = Counter()
-    matches_found = 0
+def encode_numbers(numbers):
+    """Packs numbers into an int bitmask (bit n set if n is present); order and repeats are ignored."""
+    mask = 0
+    for n in numbers:
+        if 1 <= n <= MAX_NUMBER:
+            mask |= 1 << n
+    return mask
+
+def find_matches(main_nums, onehot, bonus_nums, current_mask, bonus):
+    """
+    Flags historical draws similar to the current one.
+    Returns (is_match, is_bonus) boolean arrays covering every draw except the last
+    (which has no next draw): 3+ shared numbers, and UK49 bonus matches.
+    A draw with a missing main number can still match, but never counts as a next draw.
+    """
     match_threshold = 3
+    is_match = np.zeros(len(onehot), dtype=bool)
     
-    # Pre-calculate set for speed
-    current_set = set(current_numbers)
-    
-    for i in range(len(df) - 1):
-        row_set = get_row_numbers(df.iloc[i], game_type)
+    # Fewer than 3 distinct numbers entered can never reach the threshold
+    if current_mask.bit_count() >= match_threshold:
+        current_vec = ((current_mask >> np.arange(MAX_NUMBER + 1)) & 1).astype(np.float32)
         
-        # Intersection Match
-        if len(current_set.intersection(row_set)) >= match_threshold:
-            matches_found += 1
-            predictions.update(get_next_numbers_list(df, i, game_type))
-            
-        # Bonus Match (High Weight) - UK49 Only
-        if game_type == "UK 49s (6 + Bonus)" and len(current_numbers) > 6:
-            bonus = current_numbers[-1]
-            if 'Bonus' in df.columns and df.iloc[i]['Bonus'] == bonus:
-                predictions.update(get_next_numbers_list(df, i, game_type))
-                predictions.update(get_next_numbers_list(df, i, game_type)) # Double weight
-                
-    return predictions
+        # Overlap with every draw in a single BLAS matrix-vector product
+        is_match = onehot @ current_vec >= match_threshold
+    
+    is_bonus = np.zeros(len(onehot), dtype=bool)
+    if bonus is not None and bonus > 0:
+        is_bonus = bonus_nums == bonus
+    
+    has_next = (main_nums[1:] > 0).all(axis=1)
+    return is_match[:-1] & has_next, is_bonus[:-1] & has_next
+
+# --- Core Analysis Engines ---
+
+def analyze_patterns(followers, is_match, is_bonus):
+    """
+    Standard Frequency Analysis over the draws that followed a match.
+    Returns hit counts indexed by number (length MAX_NUMBER + 1).
+    """
+    # Intersection Match counts once, Bonus Match (UK49 Only) gets double weight
+    weights = is_match.astype(np.int32) + 2 * is_bonus
+    
+    # Each follower number adds its draw's weight
+    counts = np.bincount(followers.ravel(), weights=np.repeat(weights, followers.shape[1]),
+                         minlength=MAX_NUMBER + 1)
+    return counts.astype(np.int32)
 
-def analyze_splits(df, current_numbers, top_targets, game_type):
+def top_numbers(counts, followers, n):
+    """
+    Returns up to `n` numbers with the most hits, best first.
+    Ties go to the number seen first in `followers`, as Counter.most_common() ranks them.
+    """
+    first_pos = np.full(MAX_NUMBER + 1, followers.size, np.int64)
+    nums, first = np.unique(followers.ravel(), return_index=True)
+    first_pos[nums] = first
+    
+    # Sort key: hits first, then earliest first appearance
+    key = counts.astype(np.int64) * (followers.size + 1) - first_pos
+    top = np.argpartition(-key, n)[:n]
+    top = top[np.argsort(-key[top])]
+    return top[counts[top] > 0].tolist()
+
+def _splits_kernel(followers, targets, pair_i, pair_j):
+    """
+    Tallies split pairs of each (sorted) follower draw into counts[target, a, b, Diff/Sum].
+    Also returns `first`: the (draw, pair) position of each cell's first hit.
+    """
+    counts = np.zeros((targets.size, MAX_NUMBER + 1, MAX_NUMBER + 1, 2), np.int32)
+    first = np.zeros((targets.size, MAX_NUMBER + 1, MAX_NUMBER + 1, 2), np.int32)
+    n_pairs = pair_i.size
+    for k in range(followers.shape[0]):
+        row = followers[k]
+        for p in range(n_pairs):
+            a = row[pair_i[p]]
+            b = row[pair_j[p]]
+            d = abs(a - b)
+            s = a + b
+            for ti in range(targets.size):
+                t = targets[ti]
+                if d == t:
+                    if counts[ti, a, b, 0] == 0:
+                        first[ti, a, b, 0] = k * n_pairs + p
+                    counts[ti, a, b, 0] += 1
+                if s == t:
+                    if counts[ti, a, b, 1] == 0:
+                        first[ti, a, b, 1] = k * n_pairs + p
+                    counts[ti, a, b, 1] += 1
+    return counts, first
+
+if njit is not None:
+    @st.cache_resource
+    def _compiled_splits_kernel():
+        """
+        JIT-compiles (or loads the disk-cached) kernel once per server process.
+        Reruns re-create module functions, so the dispatcher itself is what gets cached.
+        """
+        kernel = njit(cache=True, boundscheck=False)(_splits_kernel)
+        kernel(np.ones((1, 6), np.int8), np.ones(1, np.int64), *np.triu_indices(6, k=1))
+        return kernel
+
+def _splits_numpy(followers, targets, pair_i, pair_j):
+    """NumPy fallback for `_splits_kernel` when Numba is not installed."""
+    shape = (targets.size, MAX_NUMBER + 1, MAX_NUMBER + 1, 2)
+    
+    # Every pair of every follower draw at once
+    a = followers[:, pair_i].ravel().astype(np.intp)
+    b = followers[:, pair_j].ravel().astype(np.intp)
+    
+    # Diff/Sum of every pair computed once, then tested against all targets
+    p_diff, t_diff = np.nonzero(np.abs(a - b)[:, None] == targets[None, :])
+    p_sum, t_sum = np.nonzero((a + b)[:, None] == targets[None, :])
+    
+    # Tally all hits with one bincount over flattened (target, a, b, Diff/Sum) indices
+    p = np.concatenate((p_diff, p_sum))
+    ti = np.concatenate((t_diff, t_sum))
+    kind = np.repeat([0, 1], (p_diff.size, p_sum.size))
+    flat = np.ravel_multi_index((ti, a[p], b[p], kind), shape)
+    counts = np.bincount(flat, minlength=np.prod(shape)).astype(np.int32).reshape(shape)
+    
+    # Position (draw * pairs + pair, i.e. p) of each cell's first hit
+    order = np.argsort(p, kind='stable')
+    cells, first_idx = np.unique(flat[order], return_index=True)
+    first = np.zeros(np.prod(shape), np.int32)
+    first[cells] = p[order][first_idx]
+    return counts, first.reshape(shape)
+
+def _make_splits(n_main):
+    """Builds a split tally function with one game's pair positions and engine baked in."""
+    # Positions of the pairs within a sorted draw, in combinations() order
+    pair_i, pair_j = np.triu_indices(n_main, k=1)
+    kernel = _compiled_splits_kernel() if njit is not None else _splits_numpy
+    
+    def splits(followers, targets):
+        return kernel(followers, targets, pair_i, pair_j)
+    
+    return splits
+
+# Specialized once at import so each analysis dispatches on game_type a single time
+_SPLITS = {
+    "UK 49s (6 + Bonus)": _make_splits(6),
+    "SA Daily Lotto (5 Numbers)": _make_splits(5),
+}
+
+def analyze_splits(followers, top_targets, game_type):
     """
     The Discovery Engine: Finds Split Pairs for Top Targets.
     Logic: If Target 'T' is predicted, find pairs (A, B) in next draw where |A-B|=T or A+B=T.
+    Returns {target: Counter of packed split keys}; see `decode_split`. Keys are inserted
+    in order of first appearance in history, so most_common() ties rank first-seen first.
     """
-    split_stats = {t: Counter() for t in top_targets}
-    match_threshold = 3
-    current_set = set(current_numbers)
+    counts, first = _SPLITS[game_type](followers, np.asarray(top_targets, dtype=np.int64))
     
-    for i in range(len(df) - 1):
-        row_set = get_row_numbers(df.iloc[i], game_type)
-        
-        # Check if this historical draw is similar to current (3+ matches or Bonus match)
-        is_match = len(current_set.intersection(row_set)) >= match_threshold
-        if game_type == "UK 49s (6 + Bonus)" and len(current_numbers) > 6:
-             if 'Bonus' in df.columns and df.iloc[i]['Bonus'] == current_numbers[-1]:
-                 is_match = True
-        
-        if is_match:
-            # Look at the NEXT draw
-            next_nums = get_next_numbers_list(df, i, game_type)
-            next_pairs = list(combinations(next_nums, 2))
-            
-            for t in top_targets:
-                for (a, b) in next_pairs:
-                    # Check Difference Split
-                    if abs(a - b) == t:
-                        split_stats[t][(a, b, 'Diff')] += 1
-                    # Check Sum Split
-                    if a + b == t:
-                        split_stats[t][(a, b, 'Sum')] += 1
+    # A cell's flat index in counts[t] is already a packed (a, b, Diff/Sum) int key
+    split_stats = {}
+    for ti, t in enumerate(top_targets):
+        flat = counts[ti].ravel()
+        keys = np.flatnonzero(flat)
+        keys = keys[np.argsort(first[ti].ravel()[keys])]
+        split_stats[t] = Counter(dict(zip(keys.tolist(), flat[keys].tolist())))
                         
     return split_stats
 
+def decode_split(key):
+    """Unpacks a split key from `analyze_splits` into (a, b, 'Diff' or 'Sum')."""
+    pair, kind = divmod(key, 2)
+    a, b = divmod(pair, MAX_NUMBER + 1)
+    return a, b, 'Diff' if kind == 0 else 'Sum'
+
+@st.cache_data(max_entries=64)
+def cached_splits(followers_key, top_targets, game_type, _followers):
+    """
+    Memoizes `analyze_splits` on just what determines it: a digest of the follower
+    draws plus the targets, so different inputs matching the same draws share an entry.
+    """
+    return analyze_splits(_followers, list(top_targets), game_type)
+
+@st.cache_data(max_entries=256)
+def analyze_all(main_nums, bonus_nums, _onehot, current_mask, bonus, game_type):
+    """
+    Runs the frequency and split engines in a single pass over the matched draws.
+    The current draw is given as its `encode_numbers` mask plus the UK49 bonus (or None).
+    Returns (predictions, top_targets, split_stats); predictions are hit counts per number.
+    """
+    is_match, is_bonus = find_matches(main_nums, _onehot, bonus_nums, current_mask, bonus)
+    match_idx = np.flatnonzero(is_match | is_bonus)
+    
+    # No similar draws: skip the gather, both engines and the split cache lookup
+    if match_idx.size == 0:
+        return np.zeros(MAX_NUMBER + 1, np.int32), [], {}
+    
+    # The draws following each match, gathered and sorted once for both engines
+    followers = np.sort(main_nums[match_idx + 1], axis=1)
+    
+    predictions = analyze_patterns(followers, is_match[match_idx], is_bonus[match_idx])
+    
+    # Top 7 Targets (The numbers we expect to drop)
+    top_targets = top_numbers(predictions, followers, 7)
+    followers_key = hashlib.blake2b(followers.tobytes(), digest_size=16).digest()
+    split_stats = cached_splits(followers_key, tuple(top_targets), game_type, followers)
+    
+    return predictions, top_targets, split_stats
+
 # --- Main App Interface ---
 
 if uploaded_file is not None:
     try:
         # Load & Clean
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-        df_clean = clean_data(df, game_type)
+        main_nums, bonus_nums, onehot = load_history(
+            uploaded_file.getvalue(), uploaded_file.name, game_type)
         
-        st.success(f"📂 Loaded {len(df_clean)} draws.")
+        st.success(f"📂 Loaded {len(main_nums)} draws.")
         
         # Input
         st.subheader("Enter Last Draw Results")
@@ -140,21 +312,18 @@ if uploaded_file is not None:
         if st.button("🚀 Run Split Analysis"):
             if user_input:
                 current_nums = [int(x) for x in user_input.split()]
+                bonus = None
+                if game_type == "UK 49s (6 + Bonus)" and len(current_nums) > 6:
+                    bonus = current_nums[-1]
                 
-                # 1. Run Basic Analysis to get Targets
-                with st.spinner("Finding most likely targets..."):
-                    raw_predictions = analyze_patterns(df_clean, current_nums, game_type)
+                # Targets and their Split Follow-ups in one pass
+                with st.spinner("Finding most likely targets and their splits..."):
+                    raw_predictions, top_targets, split_data = analyze_all(
+                        main_nums, bonus_nums, onehot, encode_numbers(current_nums), bonus, game_type)
                 
-                if not raw_predictions:
+                if not top_targets:
                     st.warning("No historical patterns found. Try entering just the Bonus or 3 numbers.")
                 else:
-                    # Get Top 7 Targets (The numbers we expect to drop)
-                    top_targets = [n for n, c in raw_predictions.most_common(7)]
-                    
-                    # 2. Run Split Analysis on these Targets
-                    with st.spinner("Calculating Split Follow-ups..."):
-                        split_data = analyze_splits(df_clean, current_nums, top_targets, game_type)
-                    
                     # --- DISPLAY RESULTS ---
                     
                     col1, col2 = st.columns([1, 2])
@@ -162,24 +331,26 @@ if uploaded_file is not None:
                     with col1:
                         st.subheader("🏆 Top Targets")
                         st.write("Most likely numbers to follow:")
-                        for idx, (num, hits) in enumerate(raw_predictions.most_common(7)):
-                            st.metric(f"Rank {idx+1}", num, f"{hits} Hits")
+                        for idx, num in enumerate(top_targets):
+                            st.metric(f"Rank {idx+1}", num, f"{raw_predictions[num]} Hits")
                             
                     with col2:
                         st.subheader("🔀 Split Strategy (The Follow-Ups)")
                         st.info("Instead of playing the Target directly, play these pairs that CREATE the target.")
                         
+                        # All splits go out as a single Markdown block
+                        blocks = []
                         for target in top_targets:
                             splits = split_data[target].most_common(3)
                             if splits:
-                                with st.expander(f"Target {target} - Best Splits", expanded=True):
-                                    for (p1, p2, type_), count in splits:
-                                        if type_ == 'Diff':
-                                            st.write(f"**{p1} & {p2}** (Diff {target}) - {count} times")
-                                        else:
-                                            st.write(f"**{p1} & {p2}** (Sum {target}) - {count} times")
+                                lines = [f"#### Target {target} - Best Splits"]
+                                for key, count in splits:
+                                    p1, p2, type_ = decode_split(key)
+                                    lines.append(f"- **{p1} & {p2}** ({type_} {target}) - {count} times")
+                                blocks.append("\n".join(lines))
                             else:
-                                st.write(f"Target {target}: No strong split pattern.")
+                                blocks.append(f"Target {target}: No strong split pattern.")
+                        st.markdown("\n\n".join(blocks))
 
     except Exception as e:
         st.error(f"Error: {e}")